@@ -1,4 +1,4 @@
-import re, functools
+import re, functools, sys
 from collections import ChainMap
 from databricksx12.format import *
 
@@ -19,12 +19,7 @@ class EDI():
         self.format_cls = (self.extract_delim(data) if delim_cls is None else delim_cls)
         self.data = [Segment(x, self.format_cls) for x in data.split(self.format_cls.SEGMENT_DELIM)[:-1]]
 
-        self._segment_index = {}
-        for i, segment in enumerate(self.data):
-            name = segment._name
-            if name not in self._segment_index:
-                self._segment_index[name] = []
-            self._segment_index[name].append(i)
+        self._build_segment_index()
 
         self.isa = (self.segments_by_name("ISA")[0] if len(self.segments_by_name("ISA")) > 0 else Segment.empty())
         self.sender_qualifier_id = self.isa.element(5) + self.isa.element(6)
@@ -39,6 +34,17 @@ class EDI():
         self._valid_se01()
 
 
+    #
+    # Map each segment name to the (ascending) list of indexes where it occurs in self.data
+    #
+    def _build_segment_index(self):
+        self._segment_index = {}
+        for i, segment in enumerate(self.data):
+            name = segment._name
+            if name not in self._segment_index:
+                self._segment_index[name] = []
+            self._segment_index[name].append(i)
+
     @staticmethod
     def extract_delim(data):
         return Format(ELEMENT_DELIM= data[3:4], SEGMENT_DELIM = data[105:106], SUB_DELIM = data[104:105])
@@ -66,13 +72,28 @@ class EDI():
         
         return [self.data[i] for i in filtered_indices]
 
+    #
+    # Returns a dict of segment_name -> all segments matching that name, for each name in segment_names
+    #  collected in a single pass when data is given
+    #
+    def segments_by_names(self, segment_names, data = None):
+        if data is None:
+            return {name: self.segments_by_name(name) for name in segment_names}
+        result = {name: [] for name in segment_names}
+        for x in data:
+            if x._name in result:
+                result[x._name].append(x)
+        return result
+
     #
     # Returns a tuple of all segments matching segment_name and their index
     #
     def segments_by_name_index(self, segment_name, range_start=-1, range_end = None, data = None):
-        if data is None:
-            data = self.data
-        return [(i,x) for i,x in enumerate(data) if x._name == segment_name and range_start <= i <= (range_end or len(data))]
+        if data is not None:
+            return [(i,x) for i,x in enumerate(data) if x._name == segment_name and range_start <= i <= (range_end or len(data))]
+
+        end = range_end or len(self.data)
+        return [(i, self.data[i]) for i in self._segment_index.get(segment_name, []) if range_start <= i <= end]
 
     #
     # Return the first occurence index of the specified segment
@@ -212,6 +233,7 @@ class EDI():
         self.time = state['time']
         self.control_number = state['control_number']
         self._strict_transactions = state['_strict_transactions']
+        self._build_segment_index()
 
     def __eq__(self, other):
         """
@@ -248,12 +270,13 @@ class Segment():
 
     #
     # data 
+    #  segment names come from a small fixed set, so they are interned to make name comparisons mostly identity checks
     #
     def __init__(self, data, delim_cls = AnsiX12Delim):
         self.data = data.lstrip("\r").lstrip("\n").lstrip("\r\n")
         self.format_cls = delim_cls
         self._elements = self.data.split(self.format_cls.ELEMENT_DELIM)
-        self._name = self._elements[0] if self._elements else ""
+        self._name = sys.intern(self._elements[0]) if self._elements else ""
 
 
     #
@@ -311,7 +334,7 @@ class Segment():
         self.data = state['data']
         self.format_cls = state['format_cls']
         self._elements = self.data.split(self.format_cls.ELEMENT_DELIM)
-        self._name = self._elements[0] if self._elements else ""
+        self._name = sys.intern(self._elements[0]) if self._elements else ""
 
     def __eq__(self, other):
         """
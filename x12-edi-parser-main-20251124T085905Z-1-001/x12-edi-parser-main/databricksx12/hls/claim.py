@@ -3,6 +3,7 @@ from databricksx12.hls.loop import Loop
 from databricksx12.hls.identities import *
 from typing import List, Dict
 from collections import defaultdict
+import bisect, itertools
 
 
 #
@@ -19,6 +20,30 @@ class ClaimBuilder(EDI):
         self.format_cls = delim_cls
         self.trnx_cls = trnx_type_cls
         self.loop = Loop(trnx_data)
+        self._segment_index = self.loop._segment_index # name -> sorted segment indexes over the same data, searched with bisect per claim
+
+    #
+    # Return the index of the nth occurrence of segment_name, -1 if not found (same contract as index_of_segment)
+    #  negative n counts from the end, e.g. n=-1 is the last occurrence (same as last_index_of_segment)
+    #
+    def _nth_index(self, segment_name, n=0):
+        indexes = self._segment_index.get(segment_name, [])
+        return indexes[n] if -len(indexes) <= n < len(indexes) else -1
+
+    #
+    # Return the index of the first segment_name found after position idx, default if there is none
+    #
+    def _next_index(self, segment_name, idx, default=-1):
+        indexes = self._segment_index.get(segment_name, [])
+        pos = bisect.bisect_right(indexes, idx)
+        return indexes[pos] if pos < len(indexes) else default
+
+    #
+    # Return the (sorted) indexes of segment_name found before position idx
+    #
+    def _indexes_before(self, segment_name, idx):
+        indexes = self._segment_index.get(segment_name, [])
+        return indexes[:bisect.bisect_left(indexes, idx)]
 
     #
     # Builds a claim object from
@@ -49,85 +74,85 @@ class ClaimBuilder(EDI):
     #  clm_payment_loop = 2100
     #  srv_payment_loop = 2110
     def build_remittance(self, pay_segment, idx):
-        return self.trnx_cls(trx_header_loop = self.data[0:self.index_of_segment(self.data, "N1")]
-                             ,payer_loop = self.data[self.index_of_segment(self.data, "N1"):self.index_of_segment(self.data, "N1", self.index_of_segment(self.data, "N1")+1)]
-                             ,payee_loop = self.data[self.index_of_segment(self.data, "N1", self.index_of_segment(self.data, "N1")+1): self.index_of_segment(self.data, "LX")]
-                             ,clm_loop = self.data[idx:min(
-                                 list(filter(lambda x: x > 0, [self.index_of_segment(self.data, "LX", idx+1), 
-                                  self.index_of_segment(self.data, "CLP", idx+1),
-                                  self.index_of_segment(self.data, "SE", idx+1),
-                                  len(self.data)])
-                                ))]
+        payer_idx = self._nth_index("N1", 0)
+        payee_idx = self._nth_index("N1", 1)
+        lx_idx = self._nth_index("LX", 0)
+        clm_end_idx = min(self._next_index("LX", idx, len(self.data)),
+                          self._next_index("CLP", idx, len(self.data)),
+                          self._next_index("SE", idx, len(self.data)))
+        return self.trnx_cls(trx_header_loop = self.data[0:payer_idx]
+                             ,payer_loop = self.data[payer_idx:payee_idx]
+                             ,payee_loop = self.data[payee_idx:lx_idx]
+                             ,clm_loop = self.data[idx:clm_end_idx]
                              ,trx_summary_loop = self.data[max(0,
-                                self.last_index_of_segment(self.data, "LX"),
-                                self.last_index_of_segment(self.data, "CLP"),
-                                self.last_index_of_segment(self.data, "SVC")
+                                self._nth_index("LX", -1),
+                                self._nth_index("CLP", -1),
+                                self._nth_index("SVC", -1)
                              ):]
-                             ,header_number_loop = self.data[self.index_of_segment(self.data, "LX"):idx]
+                             ,header_number_loop = self.data[lx_idx:idx]
                             )
 
     def build_enrollment(self, pay_segment, idx):
         return self.trnx_cls(
-            enrollment_member = self.data[self.index_of_segment(self.data, "INS"): self.index_of_segment(self.data, "SE")],
-            health_plan_loop=self.data[self.index_of_segment(self.data, "HD"): self.last_index_of_segment(self.data, "DTP")+1]
+            enrollment_member = self.data[self._nth_index("INS"): self._nth_index("SE")],
+            health_plan_loop=self.data[self._nth_index("HD"): self._nth_index("DTP", -1)+1]
         )
     #
     # Determine claim loop: starts at the clm index and ends at LX segment, or CLM segment, or end of data
     #
     def get_claim_loop(self, clm_idx):
-        sl_start_indexes = list(map(lambda x: x[0], filter(lambda x: x[0] > clm_idx, self.segments_by_name_index("LX"))))
-        clm_indexes = list(map(lambda x: x[0], filter(lambda x: x[0] > clm_idx, self.segments_by_name_index("CLM"))))
-
-        if sl_start_indexes:
-            clm_end_idx = min(sl_start_indexes)
-        elif clm_indexes:
-            clm_end_idx = min(clm_indexes + [len(self.data)])
-        else:
-            clm_end_idx = len(self.data)
-        
+        sl_start_idx = self._next_index("LX", clm_idx)
+        clm_end_idx = sl_start_idx if sl_start_idx != -1 else self._next_index("CLM", clm_idx, len(self.data))
         return self.data[clm_idx:clm_end_idx]
 
     #
     # fetch the indices of LX and CLM segments that are beyond the current clm index
     #
     def get_service_line_loop(self, clm_idx):
-        sl_starts = list(map(lambda x: x[0], filter(lambda x: x[0] > clm_idx, self.segments_by_name_index("LX"))))
-        if not sl_starts:
+        sl_start = self._next_index("LX", clm_idx)
+        if sl_start == -1:
             return []
-        sl_start = min(sl_starts)
-        clm_idxs = list(map(lambda x: x[0],filter(lambda x: x[0] > clm_idx, self.segments_by_name_index("CLM"))))
-        se_idxs = list(map(lambda x: x[0], filter(lambda x: x[0] > clm_idx, self.segments_by_name_index("SE"))))
-        sl_end = min(clm_idxs + se_idxs + [len(self.data)])
+        sl_end = min(self._next_index("CLM", clm_idx, len(self.data)), self._next_index("SE", clm_idx, len(self.data)))
         return self.data[sl_start:sl_end]
 
     def get_submitter_receiver_loop(self, clm_idx):
-        bht_start_indexes = list(map(lambda x: x[0], filter(lambda x: x[0] < clm_idx, self.segments_by_name_index("BHT"))))
-        bht_end_indexes = list(map(lambda x: x[0], filter(lambda x: x[0] < clm_idx and x[1].element(3) == '20', self.segments_by_name_index("HL"))))
+        bht_start_indexes = self._indexes_before("BHT", clm_idx)
         if bht_start_indexes:
-            sub_rec_start_idx = max(bht_start_indexes)
-            sub_rec_end_idx = max(bht_end_indexes)
+            sub_rec_start_idx = bht_start_indexes[-1]
+            sub_rec_end_idx = next((i for i in reversed(self._indexes_before("HL", clm_idx)) if self.data[i].element(3) == '20'), None)
+            if sub_rec_end_idx is None:
+                raise ValueError("No HL*20 (billing provider) segment found before claim at index " + str(clm_idx))
 
             return self.data[sub_rec_start_idx:sub_rec_end_idx]
         return []
 
 
+    #
+    # Claim type NAME -> (segment starting each claim, builder method)
+    #
+    _BUILD = {
+        '837I': ('CLM', 'build_claim'),
+        '837P': ('CLM', 'build_claim'),
+        '835': ('CLP', 'build_remittance'),
+        '834': ('BGN', 'build_enrollment')
+    }
+
     #
     # Given transaction type, transaction segments, and delim info, build out claims in the transaction
+    #  @param executor - optional concurrent.futures executor to build claims concurrently (claims are independent
+    #                    once the segment index is built). Must be thread based, claims/builders are not picklable.
+    #                    Default builds serially; in Spark, parallelism already comes from partitioning transactions
     #  @return a list of Claim for each "clm" segment
     #
-    def build(self):
-        if self.trnx_cls.NAME in ['837I', '837P']:
-            return [
-                self.build_claim(seg, i) for i, seg in self.segments_by_name_index("CLM")
-            ]
-        elif self.trnx_cls.NAME == '835':
-            return [
-                self.build_remittance(seg, i) for i, seg in self.segments_by_name_index("CLP")
-            ]
-        elif self.trnx_cls.NAME == '834':
-            return [
-                self.build_enrollment(seg, i) for i, seg in self.segments_by_name_index("BGN")
-            ]
+    def build(self, executor=None):
+        if self.trnx_cls.NAME not in self._BUILD:
+            return None
+        segment_name, method_name = self._BUILD[self.trnx_cls.NAME]
+        build_fn = getattr(self, method_name)
+        indexes = self._segment_index.get(segment_name, [])
+        if executor is not None:
+            return list(executor.map(build_fn, [self.data[i] for i in indexes], indexes))
+        return [build_fn(self.data[i], i) for i in indexes]
 
 #
 # Base claim class
@@ -135,29 +160,58 @@ class ClaimBuilder(EDI):
 
 class MedicalClaim(EDI):
 
+    #
+    # Claims are built in bulk (one per CLM), so keep their attributes in slots.
+    #  EDI itself declares no __slots__, so instances still carry a __dict__ for anything not listed here
+    #
+    __slots__ = ('sender_receiver_loop', 'billing_loop', 'subscriber_loop', 'patient_loop', 'claim_loop', 'sl_loop',
+                 'submitter_info', 'receiver_info', 'subscriber_info', 'patient_info', 'sl_info', 'claim_info',
+                 'provider_info', 'diagnosis_info', 'payer_info', '_sbr', '_subscriber_segments', '_nm1_spans')
+
     def __init__(
         self,
-        sender_receiver_loop: List = [],
-        billing_loop: List = [],
-        subscriber_loop: List = [],
-        patient_loop: List = [],
-        claim_loop: List = [],
-        sl_loop: List = [], 
+        sender_receiver_loop: List = None,
+        billing_loop: List = None,
+        subscriber_loop: List = None,
+        patient_loop: List = None,
+        claim_loop: List = None,
+        sl_loop: List = None, 
     ):
-        self.sender_receiver_loop = sender_receiver_loop # extracted together
-        self.billing_loop = billing_loop
-        self.subscriber_loop = subscriber_loop
-        self.patient_loop = patient_loop
-        self.claim_loop = claim_loop
-        self.sl_loop = sl_loop
+        self.sender_receiver_loop = sender_receiver_loop or [] # extracted together
+        self.billing_loop = billing_loop or []
+        self.subscriber_loop = subscriber_loop or []
+        self.patient_loop = patient_loop or []
+        self.claim_loop = claim_loop or []
+        self.sl_loop = sl_loop or []
         self.build()
 
     #
     # Return first segment found of name == name otherwise Segment.empty()
     #
     def _first(self, segments, name, start_index = 0):
-        return ([x for x in segments[start_index:] if x._name == name][0]  if len([x for x in segments[start_index:] if x._name == name]) > 0 else Segment.empty())
+        return next((x for x in itertools.islice(segments, start_index, None) if x._name == name), Segment.empty())
         
+    #
+    # Map each NM1 entity code found in segments to the span of its loop, i.e. from the first NM1
+    #  carrying that code up to the next NM1 (or the end of segments). Built in a single pass.
+    #
+    def _index_nm1(self, segments):
+        starts = [i for i, seg in enumerate(segments) if seg._name == "NM1"] + [len(segments)]
+        spans = {}
+        for start, end in self._index_to_tuples(starts):
+            spans.setdefault(segments[start].element(1), (start, end))
+        return spans
+
+    #
+    # Return the segments of the NM1 loop for entity_cd within the loop attribute loop_name, [] if not found
+    #  NM1 spans are computed once per loop and cached on the claim
+    #
+    def _nm1_loop(self, loop_name, entity_cd):
+        if loop_name not in self._nm1_spans:
+            self._nm1_spans[loop_name] = self._index_nm1(getattr(self, loop_name))
+        span = self._nm1_spans[loop_name].get(entity_cd)
+        return [] if span is None else getattr(self, loop_name)[span[0]:span[1]]
+
     def _populate_providers(self):
         return {"billing": self._billing_provider()}
     
@@ -168,57 +222,23 @@ class MedicalClaim(EDI):
         return DiagnosisIdentity(segments=self.claim_loop)
     
     def _populate_submitter_loop(self) -> Dict[str, str]:
-        # Find the submitter NM1 (entity code 41)
-        submitter_idx = -1
-        for i, seg in enumerate(self.sender_receiver_loop):
-            if seg._name == "NM1" and seg.element(1) == "41":
-                submitter_idx = i
-                break
-        
-        if submitter_idx == -1:
-            return Submitter_Receiver_Identity(segments=[])
-        
-        # Slice until the next NM1 or end of loop
-        next_nm1_idx = -1
-        for i in range(submitter_idx + 1, len(self.sender_receiver_loop)):
-            if self.sender_receiver_loop[i]._name == "NM1":
-                next_nm1_idx = i
-                break
-        
-        end_idx = next_nm1_idx if next_nm1_idx != -1 else len(self.sender_receiver_loop)
-        # GREEDY: Pass everything (NM1, PER, REF, etc.)
-        return Submitter_Receiver_Identity(segments=self.sender_receiver_loop[submitter_idx:end_idx])
+        # GREEDY: Pass everything in the submitter loop (NM1*41, PER, REF, etc.)
+        return Submitter_Receiver_Identity(segments=self._nm1_loop("sender_receiver_loop", "41"))
     
     def _populate_receiver_loop(self) -> Dict[str, str]:
-        # Find the receiver NM1 (entity code 40)
-        receiver_idx = -1
-        for i, seg in enumerate(self.sender_receiver_loop):
-            if seg._name == "NM1" and seg.element(1) == "40":
-                receiver_idx = i
-                break
-        
-        if receiver_idx == -1:
-            return Submitter_Receiver_Identity(segments=[])
-        
-        # Slice until the next NM1 or end of loop
-        next_nm1_idx = -1
-        for i in range(receiver_idx + 1, len(self.sender_receiver_loop)):
-            if self.sender_receiver_loop[i]._name == "NM1":
-                next_nm1_idx = i
-                break
-        
-        end_idx = next_nm1_idx if next_nm1_idx != -1 else len(self.sender_receiver_loop)
-        # GREEDY: Pass everything (NM1, PER, REF, etc.)
-        return Submitter_Receiver_Identity(segments=self.sender_receiver_loop[receiver_idx:end_idx])
+        # GREEDY: Pass everything in the receiver loop (NM1*40, PER, REF, etc.)
+        return Submitter_Receiver_Identity(segments=self._nm1_loop("sender_receiver_loop", "40"))
 
     def _populate_subscriber_loop(self):
-        l = self.subscriber_loop[0:min(filter(lambda x: x!= -1, [self.index_of_segment(self.subscriber_loop, "CLM"), len(self.subscriber_loop)]))] #subset the subscriber loop before the CLM segment
-        return PatientIdentity(segments=l)
+        clm_idx = next((i for i, x in enumerate(self.subscriber_loop) if x._name == "CLM"), len(self.subscriber_loop))
+        self._subscriber_segments = self.subscriber_loop[:clm_idx] #subset the subscriber loop before the CLM segment
+        return PatientIdentity(segments=self._subscriber_segments)
     
     def _populate_patient_loop(self) -> Dict[str, str]:
         # Note - if this doesn't exist then it's the same as subscriber loop
         # 01 = Spouse; 18 = Self; 19 = Child; G8 = Other
-        return self._populate_subscriber_loop() if self._first(self.subscriber_loop, "SBR").element(2) == "18" else PatientIdentity(segments=self.patient_loop)
+        #  the patient gets its own identity over the subscriber segments so the two outputs never share dicts
+        return PatientIdentity(segments=self._subscriber_segments if self._sbr.element(2) == "18" else self.patient_loop)
     
     def _populate_claim_loop(self):
         return ClaimIdentity(segments=self.claim_loop)
@@ -227,26 +247,8 @@ class MedicalClaim(EDI):
                              
 
     def _populate_payer_info(self):
-        # Find the Payer NM1 (entity code PR)
-        payer_idx = -1
-        for i, seg in enumerate(self.subscriber_loop):
-            if seg._name == "NM1" and seg.element(1) == "PR":
-                payer_idx = i
-                break
-        
-        if payer_idx == -1:
-            return PayerIdentity(segments=[])
-        
-        # Slice until the next NM1 or end of loop
-        next_nm1_idx = -1
-        for i in range(payer_idx + 1, len(self.subscriber_loop)):
-            if self.subscriber_loop[i]._name == "NM1":
-                next_nm1_idx = i
-                break
-        
-        end_idx = next_nm1_idx if next_nm1_idx != -1 else len(self.subscriber_loop)
-        # GREEDY: Pass everything (N3, N4, REF, PER, etc.)
-        return PayerIdentity(segments=self.subscriber_loop[payer_idx:end_idx])
+        # GREEDY: Pass everything in the payer loop (NM1*PR, N3, N4, REF, PER, etc.)
+        return PayerIdentity(segments=self._nm1_loop("subscriber_loop", "PR"))
     
     """
     Overall Asks
@@ -254,52 +256,50 @@ class MedicalClaim(EDI):
     """
     def to_json(self):
         return {
-            **{'submitter': self.submitter_info.to_dict()},
-            **{'receiver': self.receiver_info.to_dict()},
-            **{'subscriber': self.subscriber_info.to_dict()},
-            **{'patient': self.patient_info.to_dict()},
-            **{'payer': self.payer_info.to_dict()},
-            **{'providers': {k:v.to_dict() for k,v in self.provider_info.items()}}, #returns a dictionary of k=provider type
-            **{'claim_header': self.claim_info.to_dict()},
-            **{'claim_lines': [x.to_dict() for x in self.sl_info]}, #List
-            **{'diagnosis': self.diagnosis_info.to_dict()}
+            'submitter': self.submitter_info.to_dict(),
+            'receiver': self.receiver_info.to_dict(),
+            'subscriber': self.subscriber_info.to_dict(),
+            'patient': self.patient_info.to_dict(),
+            'payer': self.payer_info.to_dict(),
+            'providers': {k:v.to_dict() for k,v in self.provider_info.items()}, #returns a dictionary of k=provider type
+            'claim_header': self.claim_info.to_dict(),
+            'claim_lines': [x.to_dict() for x in self.sl_info], #List
+            'diagnosis': self.diagnosis_info.to_dict()
         }
 
     def _service_facility_provider(self):
-        # Find index of service facility NM1 (entity code 77)
-        facility_idx = -1
-        for i, seg in enumerate(self.claim_loop):
-            if seg._name == "NM1" and seg.element(1) == "77":
-                facility_idx = i
-                break
-        
-        if facility_idx == -1:
-            return ProviderIdentity(segments=[])
-        
-        # Find the next NM1 index (or end of loop)
-        next_nm1_idx = -1
-        for i in range(facility_idx + 1, len(self.claim_loop)):
-            if self.claim_loop[i]._name == "NM1":
-                next_nm1_idx = i
-                break
-        
-        end_idx = next_nm1_idx if next_nm1_idx != -1 else len(self.claim_loop)
-        # GREEDY: Pass everything (NM1, N3, N4, REF, PRV, etc.)
-        return ProviderIdentity(segments=self.claim_loop[facility_idx:end_idx])
+        # GREEDY: Pass everything in the service facility loop (NM1*77, N3, N4, REF, PRV, etc.)
+        return ProviderIdentity(segments=self._nm1_loop("claim_loop", "77"))
 
     #
     # Returns each claim line as an array of segments that make up the claim line
     #
     def claim_lines(self):
-        return list(map(lambda i: self.sl_loop[i[0]:i[1]],
-                self._index_to_tuples([(i) for i,y in enumerate(self.sl_loop) if y._name=="LX"]+[len(self.sl_loop)])))
+        return [self.sl_loop[a:b] for a, b in
+                self._index_to_tuples([i for i,y in enumerate(self.sl_loop) if y._name=="LX"]+[len(self.sl_loop)])]
+
+    #
+    # Same split as claim_lines() done in a single pass, returning for each claim line a tuple of
+    #  (segments, segments bucketed by name) so service line fields need no further scans
+    #
+    def _claim_line_buckets(self):
+        lines = []
+        for seg in self.sl_loop:
+            if seg._name == "LX":
+                lines.append(([], defaultdict(list)))
+            if lines:
+                lines[-1][0].append(seg)
+                lines[-1][1][seg._name].append(seg)
+        return lines
 
     def build(self) -> None:
+        self._nm1_spans = {}
         self.submitter_info = self._populate_submitter_loop()
         self.receiver_info = self._populate_receiver_loop()
+        self._sbr = self._first(self.subscriber_loop, "SBR")
         self.subscriber_info = self._populate_subscriber_loop()
         self.patient_info = (
-            self._populate_subscriber_loop() if self.patient_loop == [] else self._populate_patient_loop()
+            PatientIdentity(segments=self._subscriber_segments) if not self.patient_loop else self._populate_patient_loop()
         )
         self.sl_info =  self._populate_sl_loop()
         self.claim_info = self._populate_claim_loop()
@@ -310,74 +310,21 @@ class MedicalClaim(EDI):
 class Claim837i(MedicalClaim):
 
     NAME = "837I"
+    __slots__ = ()
 
     # Format for 837I https://www.dhs.wisconsin.gov/publications/p0/p00266.pdf
     
     def _attending_provider(self):
-        # Find index of attending provider NM1 (entity code 71)
-        attending_idx = -1
-        for i, seg in enumerate(self.claim_loop):
-            if seg._name == "NM1" and seg.element(1) == "71":
-                attending_idx = i
-                break
-        
-        if attending_idx == -1:
-            return ProviderIdentity(segments=[])
-        
-        # Find the next NM1 index (or end of loop)
-        next_nm1_idx = -1
-        for i in range(attending_idx + 1, len(self.claim_loop)):
-            if self.claim_loop[i]._name == "NM1":
-                next_nm1_idx = i
-                break
-        
-        end_idx = next_nm1_idx if next_nm1_idx != -1 else len(self.claim_loop)
-        # GREEDY: Pass everything (NM1, PRV, REF, N3, N4, etc.)
-        return ProviderIdentity(segments=self.claim_loop[attending_idx:end_idx])
+        # GREEDY: Pass everything in the attending provider loop (NM1*71, PRV, REF, N3, N4, etc.)
+        return ProviderIdentity(segments=self._nm1_loop("claim_loop", "71"))
 
     def _operating_provider(self):
-        # Find index of operating provider NM1 (entity code 72)
-        operating_idx = -1
-        for i, seg in enumerate(self.claim_loop):
-            if seg._name == "NM1" and seg.element(1) == "72":
-                operating_idx = i
-                break
-        
-        if operating_idx == -1:
-            return ProviderIdentity(segments=[])
-        
-        # Find the next NM1 index (or end of loop)
-        next_nm1_idx = -1
-        for i in range(operating_idx + 1, len(self.claim_loop)):
-            if self.claim_loop[i]._name == "NM1":
-                next_nm1_idx = i
-                break
-        
-        end_idx = next_nm1_idx if next_nm1_idx != -1 else len(self.claim_loop)
-        # GREEDY: Pass everything (NM1, PRV, REF, N3, N4, etc.)
-        return ProviderIdentity(segments=self.claim_loop[operating_idx:end_idx])
+        # GREEDY: Pass everything in the operating provider loop (NM1*72, PRV, REF, N3, N4, etc.)
+        return ProviderIdentity(segments=self._nm1_loop("claim_loop", "72"))
 
     def _other_provider(self):
-        # Find index of other provider NM1 (entity code 73)
-        other_idx = -1
-        for i, seg in enumerate(self.claim_loop):
-            if seg._name == "NM1" and seg.element(1) == "73":
-                other_idx = i
-                break
-        
-        if other_idx == -1:
-            return ProviderIdentity(segments=[])
-        
-        # Find the next NM1 index (or end of loop)
-        next_nm1_idx = -1
-        for i in range(other_idx + 1, len(self.claim_loop)):
-            if self.claim_loop[i]._name == "NM1":
-                next_nm1_idx = i
-                break
-        
-        end_idx = next_nm1_idx if next_nm1_idx != -1 else len(self.claim_loop)
-        # GREEDY: Pass everything (NM1, PRV, REF, N3, N4, etc.)
-        return ProviderIdentity(segments=self.claim_loop[other_idx:end_idx]) 
+        # GREEDY: Pass everything in the other provider loop (NM1*73, PRV, REF, N3, N4, etc.)
+        return ProviderIdentity(segments=self._nm1_loop("claim_loop", "73"))
       
     def _populate_providers(self):
         return {"billing": self._billing_provider(),
@@ -391,82 +338,48 @@ class Claim837i(MedicalClaim):
         return ClaimIdentity(segments=self.claim_loop)
 
     def _populate_sl_loop(self, missing=""):
-        return list(
-            map(lambda s:
-                ServiceLine.from_sv2(
+        return [ServiceLine.from_sv2(
                     segments=s,  # <--- NEW: Pass full raw segments
-                    sv2 = self._first(s, "SV2"),
-                    lx = self._first(s, "LX"),
-                    dtp = self.segments_by_name("DTP", data = s),
-                    amt = self.segments_by_name("AMT", data=s)
-                ),self.claim_lines()))
+                    sv2 = buckets["SV2"][0] if buckets["SV2"] else Segment.empty(),
+                    lx = buckets["LX"][0] if buckets["LX"] else Segment.empty(),
+                    dtp = buckets["DTP"],
+                    amt = buckets["AMT"]
+                ) for s, buckets in self._claim_line_buckets()]
 
     
 class Claim837p(MedicalClaim):
 
     NAME = "837P"
+    __slots__ = ()
     # Format of 837P https://www.dhs.wisconsin.gov/publications/p0/p00265.pdf
 
     def _rendering_provider(self):
-        # Find index of rendering provider NM1 (entity code 82)
-        rendering_idx = -1
-        for i, seg in enumerate(self.claim_loop):
-            if seg._name == "NM1" and seg.element(1) == "82":
-                rendering_idx = i
-                break
-        
-        if rendering_idx == -1:
-            return ProviderIdentity(segments=[])
-        
-        # Find the next NM1 index (or end of loop)
-        next_nm1_idx = -1
-        for i in range(rendering_idx + 1, len(self.claim_loop)):
-            if self.claim_loop[i]._name == "NM1":
-                next_nm1_idx = i
-                break
-        
-        end_idx = next_nm1_idx if next_nm1_idx != -1 else len(self.claim_loop)
-        # GREEDY: Pass everything (NM1, PRV, REF, N3, N4, etc.)
-        return ProviderIdentity(segments=self.claim_loop[rendering_idx:end_idx])
+        # GREEDY: Pass everything in the rendering provider loop (NM1*82, PRV, REF, N3, N4, etc.)
+        return ProviderIdentity(segments=self._nm1_loop("claim_loop", "82"))
     
     def _referring_provider(self):
-        # Find index of referring provider NM1 (entity code DN)
-        referring_idx = -1
-        for i, seg in enumerate(self.claim_loop):
-            if seg._name == "NM1" and seg.element(1) == "DN":
-                referring_idx = i
-                break
-        
-        if referring_idx == -1:
-            return ProviderIdentity(segments=[])
-        
-        # Find the next NM1 index (or end of loop)
-        next_nm1_idx = -1
-        for i in range(referring_idx + 1, len(self.claim_loop)):
-            if self.claim_loop[i]._name == "NM1":
-                next_nm1_idx = i
-                break
-        
-        end_idx = next_nm1_idx if next_nm1_idx != -1 else len(self.claim_loop)
-        # GREEDY: Pass everything (NM1, PRV, REF, N3, N4, etc.)
-        return ProviderIdentity(segments=self.claim_loop[referring_idx:end_idx])
+        # GREEDY: Pass everything in the referring provider loop (NM1*DN, PRV, REF, N3, N4, etc.)
+        return ProviderIdentity(segments=self._nm1_loop("claim_loop", "DN"))
 
 
+    #
+    # servicing provider is the rendering provider (2310B) when present, otherwise the billing provider
+    #
     def _populate_providers(self):
-        return {"billing": self._billing_provider(),
+        billing = self._billing_provider()
+        rendering = self._rendering_provider()
+        return {"billing": billing,
                 "referring": self._referring_provider(),
-                "servicing": (self._billing_provider() if self._rendering_provider() is None else self._rendering_provider()),
+                "servicing": (billing if not rendering.segments else rendering),
                 "service_facility": self._service_facility_provider()
                 }
 
     
     def _populate_sl_loop(self, missing=""):
-        return list(
-            map(lambda s:
-                ServiceLine.from_sv1(
+        return [ServiceLine.from_sv1(
                     segments=s,  # <--- NEW: Pass full raw segments
-                    sv1 = self._first(s, "SV1"),
-                    lx = self._first(s, "LX"),
-                    dtp = self.segments_by_name("DTP", data=s),
-                    amt = self.segments_by_name("AMT", data=s)
-                ), self.claim_lines()))
+                    sv1 = buckets["SV1"][0] if buckets["SV1"] else Segment.empty(),
+                    lx = buckets["LX"][0] if buckets["LX"] else Segment.empty(),
+                    dtp = buckets["DTP"],
+                    amt = buckets["AMT"]
+                ) for s, buckets in self._claim_line_buckets()]
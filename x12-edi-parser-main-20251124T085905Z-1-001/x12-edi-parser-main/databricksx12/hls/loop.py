@@ -43,6 +43,7 @@ class Loop(EDI):
         self.data = data
         self.format_cls = delim_cls
         self.mapping = loop_mapping
+        self._build_segment_index()
         self._start_indexes = self._build_hierarchy_start_indexes()
         self.loop_hierarchy = self.build_hierarchy()
 
@@ -137,7 +137,7 @@ class Remittance(MedicalClaim):
         result['service_adjustments'] = functools.reduce(lambda x,y: x+y,
             [self.populate_adjustment_groups(x)
              for x in self.segments_by_name("CAS",
-                data = self.clm_loop[1:min(  list(filter(lambda x: x>=0, [self.index_of_segment(self.clm_loop, 'SVC'), len(self.clm_loop)-1]))) ])], [])
+                data = self.clm_loop[1:min([x for x in [self.index_of_segment(self.clm_loop, 'SVC'), len(self.clm_loop)-1] if x >= 0])])], [])
         result['claim_lines'] = [self.populate_claim_line(seg, i, min(self.index_of_segment(self.clm_loop, 'SVC', i+1), len(self.clm_loop)-1)) for i,seg in self.segments_by_name_index(segment_name="SVC", data=self.clm_loop)]
         result['date_references'] = [{'date_cd': x.element(1), 'date': x.element(2)} for x in self.clm_loop if x._name == "DTM"]
         return result
@@ -166,6 +166,7 @@ class Remittance(MedicalClaim):
         raw_segments = self.clm_loop[idx:svc_end_idx]
         identity = RemittanceServiceLineIdentity(segments=raw_segments)
         greedy_data = identity.to_dict()
+        line_segments = self.segments_by_names(["AMT", "LQ", "CAS", "REF"], data=raw_segments)
 
         # 2. Explicit Mapping (Keep existing business logic)
         explicit_data = {
@@ -177,12 +178,12 @@ class Remittance(MedicalClaim):
             'original_prcdr_cd':svc.element(6),
             'service_date_qualifier_cd': self._first(self.clm_loop, "DTM", idx).element(1),
             'service_date': self._first(self.clm_loop, "DTM", idx).element(2),
-            'other_amts': [{'amt_qualifier_cd': a.element(1), 'amt': a.element(2)} for a in self.segments_by_name("AMT", data=self.clm_loop[idx:svc_end_idx]) ],
-            'remarks': [{'qualifier_cd': x.element(1), 'remark_cd': x.element(2)} for x in self.segments_by_name("LQ", data = self.clm_loop[idx:svc_end_idx])],
+            'other_amts': [{'amt_qualifier_cd': a.element(1), 'amt': a.element(2)} for a in line_segments["AMT"]],
+            'remarks': [{'qualifier_cd': x.element(1), 'remark_cd': x.element(2)} for x in line_segments["LQ"]],
             #line level service adjustments
             'service_adjustments': functools.reduce(lambda x,y: x+y,
-                [self.populate_adjustment_groups(x) for x in self.segments_by_name("CAS", data =  self.clm_loop[idx:svc_end_idx])], []),
-            'line_refs': [{'id_code_qualifier': x.element(1), 'id': x.element(2)} for x in  self.segments_by_name("REF", data=self.clm_loop[idx:svc_end_idx])]
+                [self.populate_adjustment_groups(x) for x in line_segments["CAS"]], []),
+            'line_refs': [{'id_code_qualifier': x.element(1), 'id': x.element(2)} for x in line_segments["REF"]]
         }
 
         # 3. Merge (Explicit overwrites greedy if keys collide)
@@ -196,12 +197,12 @@ class Remittance(MedicalClaim):
 
     def to_json(self):
         return {
-            **{'payment': self.trx_header_info},
-            **{'payer': self.payer_info},
-            **{'payee': self.payee_info},
-            **{'claim': self.clm_info},
-            **{'provider_adjustments': self.plb_info},
-            **{'header_info': self.header_info}
+            'payment': self.trx_header_info,
+            'payer': self.payer_info,
+            'payee': self.payee_info,
+            'claim': self.clm_info,
+            'provider_adjustments': self.plb_info,
+            'header_info': self.header_info
         }
     
     
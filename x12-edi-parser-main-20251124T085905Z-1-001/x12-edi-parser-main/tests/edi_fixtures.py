@@ -0,0 +1,47 @@
+"""
+Sample file loading shared by the greedy compliance and universal extraction tests.
+"""
+import functools
+
+
+# Control segments to exclude (envelope and transaction header segments)
+# BHT is transaction-level, not claim-level, so exclude it
+CONTROL_SEGMENTS = frozenset({'ISA', 'GS', 'GE', 'IEA', 'ST', 'SE', 'BHT'})
+
+
+#
+# The parser is imported on first use instead of at module import, so collecting
+# the tests does not load databricksx12 unless they actually run
+#
+def _parser():
+    from databricksx12.edi import EDI
+    from databricksx12.hls.healthcare import HealthcareManager
+    return EDI, HealthcareManager
+
+
+@functools.lru_cache(maxsize=8)
+def read_raw(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+#
+# Parsing and serializing a sample file is the dominant cost of these tests and
+# the results are static once built, so parse each file once per process and
+# share it between test classes.
+#
+@functools.lru_cache(maxsize=8)
+def load_and_parse(path, strict_transactions=True):
+    """
+    Returns:
+        tuple: (raw_content, edi, claims, claim_jsons)
+        
+        claim_jsons[i] is claims[i].to_json(), serialized once. Claims are not
+        modified after parsing, so tests read these instead of calling
+        to_json() again, and must not mutate them.
+    """
+    EDI, HealthcareManager = _parser()
+    raw_content = read_raw(path).decode("utf-8")
+    edi = EDI(raw_content, strict_transactions=strict_transactions)
+    claims = HealthcareManager.from_edi(edi)
+    return raw_content, edi, claims, [claim.to_json() for claim in claims]
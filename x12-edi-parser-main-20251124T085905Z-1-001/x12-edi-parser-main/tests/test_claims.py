@@ -25,6 +25,42 @@ class TestClaims(PysparkBaseTest):
         assert([y.to_dict().get("revenue_cd") for y in data.sl_info] ==['0124', '0250', '0260', '0300', '0301', '0305', '0306', '0307', '0351'])
         assert( reduce(add, [float(y.to_dict().get("line_chrg_amt")) for y in data.sl_info]) == 17166.7)
 
+    def test_professional_servicing_provider(self):
+        # no rendering provider (NM1*82) -> servicing falls back to the billing provider
+        edi = EDI(open("sampledata/837/CC_837P_EDI.txt", "rb").read().decode("utf-8"))
+        data = hm.from_edi(edi)[0].to_json()
+        assert(data['providers']['servicing'] == data['providers']['billing'])
+        edi = EDI(open("sampledata/837/Molina_Mock_UP_837P_File.txt", "rb").read().decode("utf-8"))
+        data = hm.from_edi(edi)[0]
+        assert(data.provider_info['servicing'].segments['NM1'][0][1] == '82')
+
+    def test_build_with_executor(self):
+        from concurrent.futures import ThreadPoolExecutor
+        trnx = EDI(open("sampledata/837/CHPW_Claimdata.txt", "rb").read().decode("utf-8")).functional_segments()[0].transaction_segments()[0]
+        builder = ClaimBuilder(hm.mapping.get(trnx.transaction_type), [x for x in trnx.data if x._name not in ['ST', 'SE']], trnx.format_cls)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            assert([c.to_json() for c in builder.build(executor)] == [c.to_json() for c in builder.build()])
+
+    def test_missing_roles_not_shared(self):
+        # claims without a role get their own empty identity, mutating one claim's output must not leak
+        claims = hm.from_edi(EDI(open("sampledata/837/CHPW_Claimdata.txt", "rb").read().decode("utf-8")))
+        claims[0].to_json()['providers']['referring']['segments']['NOTE'] = []
+        assert(claims[1].to_json()['providers']['referring']['segments'] == {})
+
+    def test_patient_not_shared_with_subscriber(self):
+        # patient output built from the subscriber loop must not alias the subscriber's dicts
+        for f in ["sampledata/837/CHPW_Claimdata.txt", "sampledata/837/837p.txt"]:
+            data = hm.from_edi(EDI(open(f, "rb").read().decode("utf-8")))[0]
+            subscriber = data.to_json()['subscriber']['segments']
+            patient = data.to_json()['patient']
+            patient['segments']['NOTE'] = []
+            assert(data.to_json()['subscriber']['segments'] == subscriber and 'NOTE' not in subscriber)
+
+    def test_missing_billing_hl(self):
+        # a BHT without an HL*20 before the claim is an error, not an empty result
+        edi = EDI(open("sampledata/837/CC_837P_EDI.txt", "rb").read().decode("utf-8").replace("HL*1**20", "HL*1**99"))
+        self.assertRaises(ValueError, hm.from_edi, edi)
+
     def test_835_plbs(self):
         edi = EDI(open("sampledata/835/plb_sample.txt", "rb").read().decode("utf-8"))
         data = hm.from_edi(edi)[0]
@@ -28,6 +28,14 @@ class TestEDI(PysparkBaseTest):
         assert ( len(TestEDI.y.segments_by_name("NM1")) == 5)
         assert ( set([ isinstance(type(x), type(Segment)) for x in TestEDI.x.segments_by_name("NM1") ]) == {True} )
 
+    def test_get_segments_by_names(self):
+        buckets = TestEDI.x.segments_by_names(["NM1", "ISA", "XYZ"])
+        assert ( buckets["NM1"] == TestEDI.x.segments_by_name("NM1") )
+        assert ( len(buckets["ISA"]) == 1 and buckets["XYZ"] == [] )
+        buckets = TestEDI.x.segments_by_names(["NM1", "XYZ"], data=TestEDI.x.data[15:20])
+        assert ( buckets["NM1"] == TestEDI.x.segments_by_name("NM1", data=TestEDI.x.data[15:20]) )
+        assert ( buckets["XYZ"] == [] )
+
     def test_segments_by_position(self):
         assert(TestEDI.x.segments_by_position(0,1)[0]._name == "ISA")
         assert(TestEDI.y.segments_by_position(0,1)[0]._name == "ISA")
@@ -7,9 +7,108 @@ greedy/universal extraction refactoring.
 """
 import unittest
 import json
-from databricksx12.edi import EDI
-from databricksx12.hls.healthcare import HealthcareManager
-from databricksx12.edi import Segment
+import functools
+import re
+import sys
+from .edi_fixtures import CONTROL_SEGMENTS, read_raw, load_and_parse
+
+
+# Service line context in the raw file: opening segment -> segments that close it
+SERVICE_LINE_CONTEXTS = {
+    'LX': frozenset({'CLM', 'HL'}),   # 837 service line (2400)
+    'SVC': frozenset({'CLP', 'LX'}),  # 835 service payment (2110)
+}
+
+
+#
+# Regex matching a segment name: it follows the start of the file or a segment
+# delimiter and precedes the first element delimiter, and is not in exclude.
+# Lets findall() walk the raw bytes once when only segment names are needed.
+#
+@functools.lru_cache(maxsize=None)
+def _segment_name_re(segment_delim, element_delim, exclude=CONTROL_SEGMENTS):
+    element_delim = re.escape(element_delim)
+    skip = b''
+    if exclude:
+        skip = rb'(?!(?:' + b'|'.join(re.escape(s.encode()) for s in sorted(exclude)) + rb')' + element_delim + rb')'
+    return re.compile(rb'(?:^|' + re.escape(segment_delim) + rb')\s*' + skip +
+                      rb'([A-Z][A-Z0-9]{1,2})' + element_delim)
+
+
+#
+# Regex matching one service line region of the raw file: from a context's opening
+#  segment up to (not including) the next segment that closes it, or end of file.
+#  Further opening segments inside a region are part of it.
+#
+@functools.lru_cache(maxsize=None)
+def _service_line_re(segment_delim, element_delim, context):
+    segment_delim, element_delim = re.escape(segment_delim), re.escape(element_delim)
+    closing = b'|'.join(re.escape(s.encode()) for s in sorted(SERVICE_LINE_CONTEXTS[context]))
+    return re.compile(rb'(?:^|' + segment_delim + rb')\s*' + re.escape(context.encode()) + element_delim +
+                      rb'.*?(?=' + segment_delim + rb'\s*(?:' + closing + rb')' + element_delim + rb'|\Z)',
+                      re.DOTALL)
+
+
+#
+# Tokenize the raw bytes of a sample file once, so tests do not re-split it.
+# Segment names and delimiters are ASCII, so the scan compares undecoded bytes
+# and only decodes what tests assert on.
+#
+@functools.lru_cache(maxsize=8)
+def _tokenize(path, strict_transactions=True):
+    """
+    Returns:
+        dict: {
+            'input_segments': (segment_name, full_segment_string) excluding control segments,
+            'raw_segment_names': set of non-control segment names,
+            'service_line_segments': {context: set of segment names found inside it}
+        }
+    """
+    _, edi, _, _ = load_and_parse(path, strict_transactions)
+    raw_bytes = read_raw(path)
+    segment_delim = edi.format_cls.SEGMENT_DELIM.encode()
+    element_delim = edi.format_cls.ELEMENT_DELIM.encode()
+    
+    all_tokens = []
+    for line in raw_bytes.split(segment_delim):
+        line = line.strip()
+        # Extract segment name (first element), one scan finds both the name and the delimiter
+        seg_name, found, _ = line.partition(element_delim)
+        if found:
+            seg_name = seg_name.strip()
+            if seg_name:
+                all_tokens.append((seg_name, line))
+    
+    # Segment names inside each service line context, found by the regex engine
+    # rather than a per-segment state machine; the opening segment itself is not counted
+    name_re = _segment_name_re(segment_delim, element_delim, frozenset())
+    found = {}
+    for context in SERVICE_LINE_CONTEXTS:
+        found[context] = {name for region in _service_line_re(segment_delim, element_delim, context).finditer(raw_bytes)
+                          for name in name_re.findall(region.group(0))}
+        found[context].discard(context.encode())
+    
+    # Decoded names are interned, like Segment._name, so comparing them against
+    # segment names from the parsed output is mostly an identity check
+    control_segments = frozenset(s.encode() for s in CONTROL_SEGMENTS)
+    input_segments = [(sys.intern(n.decode()), l.decode("utf-8")) for (n, l) in all_tokens if n not in control_segments]
+    return {
+        'input_segments': input_segments,
+        'raw_segment_names': {n for n, _ in input_segments},
+        'service_line_segments': {context: {sys.intern(n.decode()) for n in names}
+                                  for context, names in found.items()},
+    }
+
+
+@functools.lru_cache(maxsize=8)
+def _raw_segment_names(path, strict_transactions=True):
+    """
+    Returns:
+        set: non-control segment names found in the raw file
+    """
+    _, edi, _, _ = load_and_parse(path, strict_transactions)
+    regex = _segment_name_re(edi.format_cls.SEGMENT_DELIM.encode(), edi.format_cls.ELEMENT_DELIM.encode())
+    return {sys.intern(name.decode()) for name in regex.findall(read_raw(path))}
 
 
 class TestGreedyCompliance(unittest.TestCase):
@@ -18,43 +117,11 @@ class TestGreedyCompliance(unittest.TestCase):
     Does not require Spark, uses standard unittest.
     """
     
-    def _extract_input_segments(self, raw_content, edi_obj):
-        """
-        Step A: Tokenize raw EDI text into segments (excluding envelope segments).
-        
-        Returns:
-            list: List of tuples (segment_name, full_segment_string)
-        """
-        input_segments = []
-        segment_delim = edi_obj.format_cls.SEGMENT_DELIM
-        element_delim = edi_obj.format_cls.ELEMENT_DELIM
-        
-        # Split by segment delimiter
-        lines = raw_content.split(segment_delim)
-        
-        # Control segments to exclude (envelope and transaction header segments)
-        # BHT is transaction-level, not claim-level, so exclude it
-        control_segments = {'ISA', 'GS', 'GE', 'IEA', 'ST', 'SE', 'BHT'}
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            
-            # Extract segment name (first element)
-            if element_delim in line:
-                parts = line.split(element_delim)
-                if parts and parts[0]:
-                    seg_name = parts[0].strip()
-                    # Skip control segments
-                    if seg_name and seg_name not in control_segments:
-                        input_segments.append((seg_name, line))
-        
-        return input_segments
-    
-    def _flatten_json_segments(self, obj, path="", collected=None):
+    def _flatten_json_segments(self, root):
         """
-        Step B: Recursively traverse JSON output and collect all segment data.
+        Step B: Traverse JSON output and collect all segment data.
+        Uses an explicit stack instead of recursion, so deeply nested claims
+        cost no extra Python frames.
         
         Collects:
         1. All values from 'segments' dictionaries
@@ -66,43 +133,41 @@ class TestGreedyCompliance(unittest.TestCase):
                 'values': set of all string values found
             }
         """
-        if collected is None:
-            collected = {'segments': set(), 'values': set(), 'segment_data': []}
-        
-        if isinstance(obj, dict):
-            # Check for segments dictionary (greedy storage)
-            if 'segments' in obj and isinstance(obj['segments'], dict):
-                for seg_name, seg_list in obj['segments'].items():
-                    collected['segments'].add(seg_name)
-                    # Collect all element values from segments
-                    for seg_elements in seg_list:
-                        if isinstance(seg_elements, list):
-                            for elem in seg_elements:
-                                if isinstance(elem, list):
-                                    # Sub-elements
-                                    for sub_elem in elem:
-                                        if sub_elem:
-                                            collected['values'].add(str(sub_elem))
-                                elif elem:
-                                    collected['values'].add(str(elem))
-                            # Store segment data for detailed comparison
-                            collected['segment_data'].append((seg_name, seg_elements))
-            
-            # Collect all string values from mapped fields
-            for key, value in obj.items():
-                if isinstance(value, str) and value:
-                    collected['values'].add(value)
-                elif isinstance(value, (int, float)):
-                    collected['values'].add(str(value))
-                elif isinstance(value, list):
-                    for item in value:
-                        self._flatten_json_segments(item, f"{path}.{key}", collected)
-                elif isinstance(value, dict):
-                    self._flatten_json_segments(value, f"{path}.{key}", collected)
-        
-        elif isinstance(obj, list):
-            for item in obj:
-                self._flatten_json_segments(item, path, collected)
+        collected = {'segments': set(), 'values': set()}
+        # Hoist bound methods out of the traversal loop
+        segments_add = collected['segments'].add
+        values_add = collected['values'].add
+        values_update = collected['values'].update
+        stack = [root]
+        stack_pop, stack_append, stack_extend = stack.pop, stack.append, stack.extend
+        
+        # Dispatch on exact type rather than isinstance(): to_json() only emits
+        # built-in dict/list/str/int/float values, never subclasses of them
+        while stack:
+            obj = stack_pop()
+            if type(obj) is dict:
+                for key, value in obj.items():
+                    t = type(value)
+                    if t is dict and key == 'segments':
+                        # Segments dictionary (greedy storage): collect all element values
+                        for seg_name, seg_list in value.items():
+                            segments_add(seg_name)
+                            for seg_elements in seg_list:
+                                if type(seg_elements) is list:
+                                    # Elements, and the sub-elements of composite elements; these
+                                    # are already strings, so str() is only called on anything else
+                                    values_update(x if type(x) is str else str(x) for elem in seg_elements
+                                                  for x in (elem if type(elem) is list else (elem,)) if x)
+                    elif t is dict or t is list:
+                        stack_append(value)
+                    # Collect all string values from mapped fields
+                    elif t is str:
+                        if value:
+                            values_add(value)
+                    elif t is int or t is float:
+                        values_add(str(value))
+            elif type(obj) is list:
+                stack_extend(obj)
         
         return collected
     
@@ -124,28 +189,23 @@ class TestGreedyCompliance(unittest.TestCase):
         can be found in the output.
         """
         # Load and parse 837P file
-        with open("sampledata/837/837p.txt", "rb") as f:
-            raw_content = f.read().decode("utf-8")
-        
-        edi = EDI(raw_content)
-        claims = HealthcareManager.from_edi(edi)
+        raw_content, edi, claims, claim_jsons = load_and_parse("sampledata/837/837p.txt")
         
         self.assertGreater(len(claims), 0, "Should parse at least one claim")
         
         # Step A: Extract input segments
-        input_segments = self._extract_input_segments(raw_content, edi)
+        tokens = _tokenize("sampledata/837/837p.txt")
+        input_segments = tokens['input_segments']
         
         # Step B: Extract output segments and values
-        all_output_data = {'segments': set(), 'values': set(), 'segment_data': []}
-        for claim in claims:
-            claim_json = claim.to_json()
+        all_output_data = {'segments': set(), 'values': set()}
+        for claim_json in claim_jsons:
             output_data = self._flatten_json_segments(claim_json)
             all_output_data['segments'].update(output_data['segments'])
             all_output_data['values'].update(output_data['values'])
-            all_output_data['segment_data'].extend(output_data['segment_data'])
         
         # Assertion: Verify every input segment name exists in output
-        input_seg_names = {seg[0] for seg in input_segments}
+        input_seg_names = tokens['raw_segment_names']
         missing_seg_names = input_seg_names - all_output_data['segments']
         
         self.assertEqual(
@@ -158,18 +218,18 @@ class TestGreedyCompliance(unittest.TestCase):
         
         # Assertion: Verify segment values can be found
         # For each input segment, check that its values appear in output
-        missing_values = []
-        for seg_name, seg_string in input_segments:
-            normalized_input = self._normalize_segment_string(seg_string, edi)
-            # Extract values from input segment
-            input_parts = normalized_input.split(edi.format_cls.ELEMENT_DELIM)
-            input_values = [p for p in input_parts[1:] if p]  # Skip segment name
-            
-            # Check if values exist in output
-            found_values = sum(1 for val in input_values if val in all_output_data['values'])
-            
-            if found_values == 0 and len(input_values) > 0:
-                missing_values.append((seg_name, seg_string))
+        element_delim = edi.format_cls.ELEMENT_DELIM
+        # Extract values from each input segment, skipping the segment name
+        input_values_by_seg = [
+            (seg_name, seg_string,
+             set(filter(None, self._normalize_segment_string(seg_string, edi).split(element_delim)[1:])))
+            for seg_name, seg_string in input_segments
+        ]
+        
+        # A segment is missing when none of its values exist in output
+        out_values = all_output_data['values']
+        missing_values = [(seg_name, seg_string) for seg_name, seg_string, input_values in input_values_by_seg
+                          if input_values and input_values.isdisjoint(out_values)]
         
         # Allow some tolerance for formatted values, but log missing
         if missing_values:
@@ -186,28 +246,21 @@ class TestGreedyCompliance(unittest.TestCase):
         Test 1b: The "Nuclear" Data Conservation Test (837I)
         """
         # Load and parse 837I file
-        with open("sampledata/837/CC_837I_EDI.txt", "rb") as f:
-            raw_content = f.read().decode("utf-8")
-        
-        edi = EDI(raw_content)
-        claims = HealthcareManager.from_edi(edi)
+        raw_content, edi, claims, claim_jsons = load_and_parse("sampledata/837/CC_837I_EDI.txt")
         
         self.assertGreater(len(claims), 0, "Should parse at least one claim")
         
-        # Step A: Extract input segments
-        input_segments = self._extract_input_segments(raw_content, edi)
+        # Step A: Extract input segment names
+        input_seg_names = _raw_segment_names("sampledata/837/CC_837I_EDI.txt")
         
         # Step B: Extract output segments
-        all_output_data = {'segments': set(), 'values': set(), 'segment_data': []}
-        for claim in claims:
-            claim_json = claim.to_json()
+        all_output_data = {'segments': set(), 'values': set()}
+        for claim_json in claim_jsons:
             output_data = self._flatten_json_segments(claim_json)
             all_output_data['segments'].update(output_data['segments'])
             all_output_data['values'].update(output_data['values'])
-            all_output_data['segment_data'].extend(output_data['segment_data'])
         
         # Assertion: Verify every input segment name exists in output
-        input_seg_names = {seg[0] for seg in input_segments}
         missing_seg_names = input_seg_names - all_output_data['segments']
         
         self.assertEqual(
@@ -226,26 +279,18 @@ class TestGreedyCompliance(unittest.TestCase):
         not just NM1.
         """
         # Load Molina file (has complex payer/provider structure)
-        with open("sampledata/837/Molina_Mock_UP_837P_File.txt", "rb") as f:
-            raw_content = f.read().decode("utf-8")
-        
-        edi = EDI(raw_content)
-        claims = HealthcareManager.from_edi(edi)
+        raw_content, edi, claims, claim_jsons = load_and_parse("sampledata/837/Molina_Mock_UP_837P_File.txt")
         
         self.assertGreater(len(claims), 0, "Should parse at least one claim")
         
         claim = claims[0]
         
         # Check Payer Loop (2010BB) - should contain N3, N4, REF
-        if hasattr(claim, 'payer_info') and claim.payer_info:
-            self.assertTrue(
-                hasattr(claim.payer_info, 'segments'),
-                "payer_info should have 'segments' attribute"
-            )
-            
-            payer_segments = claim.payer_info.segments
+        payer = getattr(claim, 'payer_info', None)
+        if payer:
+            payer_segments = getattr(payer, 'segments', None)
             self.assertIsInstance(payer_segments, dict, 
-                                 "payer_info.segments should be a dictionary")
+                                 "payer_info should have a 'segments' dictionary")
             
             # Critical assertion: Payer should have more than just NM1
             if len(payer_segments) > 0:
@@ -263,17 +308,13 @@ class TestGreedyCompliance(unittest.TestCase):
                     )
         
         # Check Provider Loops - verify they contain REF or PRV
-        if hasattr(claim, 'provider_info') and claim.provider_info:
-            for provider_type, provider in claim.provider_info.items():
+        providers = getattr(claim, 'provider_info', None)
+        if providers:
+            for provider_type, provider in providers.items():
                 if provider:
-                    self.assertTrue(
-                        hasattr(provider, 'segments'),
-                        f"Provider ({provider_type}) should have 'segments' attribute"
-                    )
-                    
-                    provider_segments = provider.segments
+                    provider_segments = getattr(provider, 'segments', None)
                     self.assertIsInstance(provider_segments, dict,
-                                         f"Provider ({provider_type}).segments should be a dictionary")
+                                         f"Provider ({provider_type}) should have a 'segments' dictionary")
                     
                     # If provider has NM1, it should have additional segments
                     if 'NM1' in provider_segments and len(provider_segments) > 0:
@@ -296,40 +337,29 @@ class TestGreedyCompliance(unittest.TestCase):
         captures all segments in the service line loop.
         """
         # Load 837P file
-        with open("sampledata/837/837p.txt", "rb") as f:
-            raw_content = f.read().decode("utf-8")
-        
-        edi = EDI(raw_content)
-        claims = HealthcareManager.from_edi(edi)
+        raw_content, edi, claims, claim_jsons = load_and_parse("sampledata/837/837p.txt")
         
         self.assertGreater(len(claims), 0, "Should parse at least one claim")
         
         claim = claims[0]
         
         # Check service lines exist
-        self.assertTrue(
-            hasattr(claim, 'sl_info') and len(claim.sl_info) > 0,
-            "Claim should have at least one service line"
-        )
+        sl_info = getattr(claim, 'sl_info', None)
+        self.assertTrue(sl_info, "Claim should have at least one service line")
         
         # Access first ServiceLine
-        first_sl = claim.sl_info[0]
+        first_sl = sl_info[0]
         
         # Assertion 1: segments dictionary exists and is not empty
-        self.assertTrue(
-            hasattr(first_sl, 'segments'),
-            "ServiceLine should have 'segments' attribute"
-        )
-        
+        sl_segments = getattr(first_sl, 'segments', None)
         self.assertIsInstance(
-            first_sl.segments, 
+            sl_segments, 
             dict,
-            "ServiceLine.segments should be a dictionary"
+            "ServiceLine should have a 'segments' dictionary"
         )
         
         # Assertion 2: segments dictionary should contain service line segments
         # Standard segments: LX, SV1/SV2, DTP
-        sl_segments = first_sl.segments
         
         # Should have at least LX and SV1 (for 837P) or SV2 (for 837I)
         has_lx = 'LX' in sl_segments
@@ -346,24 +376,8 @@ class TestGreedyCompliance(unittest.TestCase):
         has_dtp = 'DTP' in sl_segments
         
         # Also verify DTP appears in the raw segments if present
-        # Parse raw file to find DTP segments in service lines
-        segment_delim = edi.format_cls.SEGMENT_DELIM
-        element_delim = edi.format_cls.ELEMENT_DELIM
-        lines = raw_content.split(segment_delim)
-        
         # Find DTP segments after LX segments (service line context)
-        found_dtp_in_raw = False
-        in_service_line = False
-        for line in lines:
-            if element_delim in line:
-                seg_name = line.split(element_delim)[0].strip()
-                if seg_name == 'LX':
-                    in_service_line = True
-                elif seg_name in ['CLM', 'HL'] and in_service_line:
-                    in_service_line = False
-                elif seg_name == 'DTP' and in_service_line:
-                    found_dtp_in_raw = True
-                    break
+        found_dtp_in_raw = 'DTP' in _tokenize("sampledata/837/837p.txt")['service_line_segments']['LX']
         
         # If DTP exists in raw file within service line, it should be in segments
         if found_dtp_in_raw:
@@ -391,18 +405,12 @@ class TestGreedyCompliance(unittest.TestCase):
         including LQ, AMT, REF, etc.
         """
         # Load 835 file with service lines
-        with open("sampledata/835/sample_services.txt", "rb") as f:
-            raw_content = f.read().decode("utf-8")
-        
-        edi = EDI(raw_content, strict_transactions=False)
-        remittances = HealthcareManager.from_edi(edi)
+        raw_content, edi, remittances, remittance_jsons = load_and_parse("sampledata/835/sample_services.txt", strict_transactions=False)
         
         self.assertGreater(len(remittances), 0, "Should parse at least one remittance")
         
-        remittance = remittances[0]
-        
         # Navigate to claim lines (Service Payment Loop 2110)
-        remittance_json = remittance.to_json()
+        remittance_json = remittance_jsons[0]
         
         self.assertIn('claim', remittance_json, "Remittance should have 'claim' key")
         claim_data = remittance_json['claim']
@@ -429,31 +437,11 @@ class TestGreedyCompliance(unittest.TestCase):
         )
         
         # Assertion 2: Verify LQ (Remarks) or AMT (Allowed Amount) segments
-        # Check raw file for these segments
-        segment_delim = edi.format_cls.SEGMENT_DELIM
-        element_delim = edi.format_cls.ELEMENT_DELIM
-        lines = raw_content.split(segment_delim)
-        
-        # Find segments in service line context (after SVC)
-        found_lq = False
-        found_amt = False
-        found_ref = False
-        in_service_line = False
-        
-        for line in lines:
-            if element_delim in line:
-                seg_name = line.split(element_delim)[0].strip()
-                if seg_name == 'SVC':
-                    in_service_line = True
-                elif seg_name in ['SVC', 'CLP', 'LX'] and in_service_line and seg_name != 'SVC':
-                    in_service_line = False
-                elif in_service_line:
-                    if seg_name == 'LQ':
-                        found_lq = True
-                    elif seg_name == 'AMT':
-                        found_amt = True
-                    elif seg_name == 'REF':
-                        found_ref = True
+        # Check raw file for these segments in service line context (after SVC)
+        svc_segments = _tokenize("sampledata/835/sample_services.txt", strict_transactions=False)['service_line_segments']['SVC']
+        found_lq = 'LQ' in svc_segments
+        found_amt = 'AMT' in svc_segments
+        found_ref = 'REF' in svc_segments
         
         # If these segments exist in raw file, they should be in output
         if found_lq: